@@ -19,16 +19,90 @@ PACKET FLOW when you run this:
 
 The "PSH" (push) flag tells the receiver's kernel to immediately deliver
 the data to the application, rather than buffering it.
+
+SCRIPTED USE:
+  seq 100000 | NETLAB_CLIENT_MODE=script python tcp_client.py > echoed.txt
+
+  Streams stdin to the server and the echoes to stdout, both at once,
+  instead of one prompt → send → wait-for-reply round trip per line.
+
+BENCHMARK:
+  NETLAB_CLIENT_MODE=bench python tcp_client.py
+
+  Opens a pool of NETLAB_BENCH_CONNS connections once, then round-trips
+  NETLAB_BENCH_MSGS small messages over them — connection setup is paid
+  once per pool, not once per message.
 """
 
+import collections
+import os
+import selectors
 import socket
 import sys
+import time
+
+# interactive — prompt, send one line, wait for its echo (default)
+# script      — stream stdin ↔ socket full-duplex, raw bytes, no prompts
+# bench       — time many echoes over a pool of kept-alive connections
+CLIENT_MODE = os.environ.get("NETLAB_CLIENT_MODE", "interactive")
+
+CHUNK = 65536
+
+BENCH_CONNS = int(os.environ.get("NETLAB_BENCH_CONNS", "16"))
+BENCH_MSGS = int(os.environ.get("NETLAB_BENCH_MSGS", "10000"))
+BENCH_SIZE = 64
+
+
+class ConnectionPool:
+    """
+    A fixed set of open connections, handed out and taken back.
+
+    Every new TCP connection costs a full round trip for the 3-way handshake
+    before the first byte of data, plus slow start on a cold congestion
+    window. A pool pays that once, up front, and then reuses the warm
+    connections for every request.
+
+    Connections that sit idle in a pool can be silently dropped by a NAT or
+    firewall that forgets the flow. SO_KEEPALIVE makes the kernel probe an
+    idle connection (after TCP_KEEPIDLE seconds) so the mapping stays alive
+    and a dead peer is noticed.
+    """
+
+    def __init__(self, host: str, port: int, size: int = 16):
+        self.host = host
+        self.port = port
+        self.idle = collections.deque()
+        for _ in range(size):
+            self.idle.append(self.connect())
+
+    def connect(self) -> socket.socket:
+        sock = socket.create_connection((self.host, self.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"):  # Linux; macOS calls it TCP_KEEPALIVE
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
+        return sock
+
+    def acquire(self) -> socket.socket:
+        # Pool exhausted → open an extra one rather than fail
+        return self.idle.popleft() if self.idle else self.connect()
+
+    def release(self, sock: socket.socket):
+        self.idle.append(sock)
+
+    def close(self):
+        while self.idle:
+            self.idle.popleft().close()
 
 
 def main():
     host = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1"
     port = int(sys.argv[2]) if len(sys.argv) > 2 else 9000
 
+    if CLIENT_MODE == "bench":
+        run_bench(lambda size: ConnectionPool(host, port, size))
+        return
+
     # Create the socket (same as server — AF_INET + SOCK_STREAM = TCP over IPv4)
     client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -39,13 +113,28 @@ def main():
     #
     # If the server isn't listening → "Connection refused" (kernel sends RST back)
     # If the server is unreachable → "Connection timed out" (SYN retries exhaust)
-    print(f"[*] Connecting to {host}:{port}...")
+    #
+    # In script mode stdout carries the echoed bytes, so chatter goes to stderr.
+    log = sys.stderr if CLIENT_MODE == "script" else sys.stdout
+    print(f"[*] Connecting to {host}:{port}...", file=log)
     try:
         client.connect((host, port))
     except ConnectionRefusedError:
-        print(f"[!] Connection refused — is the server running on {host}:{port}?")
+        print(f"[!] Connection refused — is the server running on {host}:{port}?", file=log)
         sys.exit(1)
 
+    # Turn off Nagle's algorithm so each message goes out immediately instead
+    # of waiting (up to ~40 ms) for the ACK of the previous one. See the
+    # comment in tcp_server.py for the latency-vs-throughput tradeoff.
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    if CLIENT_MODE == "script":
+        try:
+            run_script(client)
+        finally:
+            client.close()
+        return
+
     print(f"[+] Connected! Local address: {client.getsockname()}")
     print(f"    Remote address: {client.getpeername()}")
     print(f"    This connection is uniquely identified by the 4-tuple:")
@@ -94,5 +183,122 @@ def main():
         client.close()
 
 
+def run_script(client: socket.socket):
+    """
+    Pump stdin → server and server → stdout concurrently.
+
+    The interactive loop is strict lockstep: block on input(), send, block on
+    recv(). Nothing flows server → client while we wait on the keyboard, and
+    every line costs a str from input() plus a bytes from .encode(). Here one
+    selector watches both stdin and the socket, so the two directions run
+    independently and each keeps its pipe full. Bytes go from stdin into one
+    reused bytearray and out to the socket as-is — no str, no encode.
+
+    A read() on a readable fd returns what's there without waiting, so stdin
+    itself can stay blocking (a terminal shares it with stdout, and making
+    one non-blocking would make both non-blocking).
+    """
+    stdin = sys.stdin.buffer.raw
+    stdout = sys.stdout.buffer
+    client.setblocking(False)
+
+    inbuf = bytearray(CHUNK)    # stdin → socket
+    recvbuf = bytearray(CHUNK)  # socket → stdout
+    pending = memoryview(b"")   # part of inbuf the kernel hasn't taken yet
+    stdin_open = True
+
+    # poll(), not the default epoll: epoll refuses regular files (EPERM), so
+    # `< input.txt` would fail. poll() just reports a file as always readable.
+    sel = selectors.PollSelector()
+    sel.register(stdin, selectors.EVENT_READ)
+    sel.register(client, selectors.EVENT_READ)
+
+    try:
+        while True:
+            for key, mask in sel.select():
+                if key.fileobj is stdin:
+                    n = stdin.readinto(inbuf)
+                    sel.unregister(stdin)
+                    if not n:
+                        # EOF on stdin: half-close so the server sees FIN, but
+                        # keep reading — echoes may still be on their way.
+                        stdin_open = False
+                        client.shutdown(socket.SHUT_WR)
+                        continue
+                    pending = memoryview(inbuf)[:n]
+                    # Don't read more stdin until this chunk is in the kernel
+                    # — that's our backpressure when the server is slow.
+                    sel.modify(client, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+                elif mask & selectors.EVENT_READ:
+                    n = client.recv_into(recvbuf)
+                    if not n:
+                        if stdin_open:
+                            print("[!] Server closed the connection", file=sys.stderr)
+                        return
+                    stdout.write(memoryview(recvbuf)[:n])
+                    stdout.flush()
+
+                if pending and mask & selectors.EVENT_WRITE:
+                    try:
+                        sent = client.send(pending)
+                    except BlockingIOError:
+                        sent = 0
+                    pending = pending[sent:]
+                    if not pending:
+                        sel.modify(client, selectors.EVENT_READ)
+                        sel.register(stdin, selectors.EVENT_READ)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sel.close()
+
+
+def run_bench(make_pool) -> ConnectionPool:
+    """
+    Round-trip BENCH_MSGS messages over a pool of BENCH_CONNS connections.
+
+    Each message takes the next idle connection, so the load is spread
+    round-robin across the pool. Returns the (closed) pool for its stats.
+    """
+    start = time.perf_counter()
+    try:
+        pool = make_pool(BENCH_CONNS)
+    except ConnectionRefusedError:
+        print("[!] Connection refused — is the server running?")
+        sys.exit(1)
+    opened = time.perf_counter() - start
+    print(f"[*] Opened {BENCH_CONNS} connections in {opened * 1000:.1f} ms")
+
+    payload = b"x" * BENCH_SIZE
+    reply = bytearray(BENCH_SIZE)
+    start = time.perf_counter()
+    try:
+        for _ in range(BENCH_MSGS):
+            sock = pool.acquire()
+            sock.sendall(payload)
+            recv_exact(sock, reply)
+            pool.release(sock)
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"[*] {BENCH_MSGS} echoes of {BENCH_SIZE} bytes in {elapsed:.3f}s: "
+          f"{BENCH_MSGS / elapsed:.0f} msg/s, "
+          f"{elapsed / BENCH_MSGS * 1e6:.0f} µs per round trip")
+    return pool
+
+
+def recv_exact(sock: socket.socket, buf: bytearray):
+    """Fill buf completely — one echo may come back over several recv()s."""
+    view = memoryview(buf)
+    got = 0
+    while got < len(buf):
+        n = sock.recv_into(view[got:])
+        if not n:
+            raise ConnectionError("server closed the connection")
+        got += n
+
+
 if __name__ == "__main__":
     main()
@@ -7,6 +7,7 @@ WHAT THIS TEACHES:
 - The TCP 3-way handshake (SYN → SYN-ACK → ACK)
 - Connection lifecycle: bind → listen → accept → recv/send → close
 - What happens at each step in terms of actual network packets
+- Serving many clients from ONE thread with an event loop (epoll)
 
 HOW TCP WORKS (the 3-way handshake):
   Client                    Server
@@ -33,62 +34,725 @@ OBSERVE IT LIVE:
   python tcp_client.py
 
   You'll see the SYN, SYN-ACK, ACK, then your data packets, then FIN to close.
+
+  The server logs connections only. To see every message and its bytes:
+  NETLAB_DUMP_HEX=1 python tcp_server.py
+
+IO BACKENDS (same echo, different kernel interface):
+  python tcp_server.py                              # epoll via selectors
+  NETLAB_IO_BACKEND=uring python tcp_server.py      # io_uring (see uring.py)
+  NETLAB_IO_BACKEND=threads python tcp_server.py    # blocking IO, thread pool
+  NETLAB_IO_BACKEND=asyncio python tcp_server.py    # asyncio streams (uvloop
+                                                    # if installed)
+
+KERNEL ZERO-COPY MODES (selectors backend):
+  NETLAB_ECHO_MODE=splice python tcp_server.py      # echo without the bytes
+                                                    # ever entering Python
+  NETLAB_SERVE_FILE=/etc/services python tcp_server.py
+                                                    # send a file with sendfile()
+
+  Compare syscalls per message with: strace -c -f python tcp_server.py
+
+  NETLAB_WORKERS=0 python tcp_server.py             # one process per CPU
+  NETLAB_BUSYWAIT=1 python tcp_server.py            # poll instead of sleeping
+                                                    # (burns a whole core!)
 """
 
+import collections
+import ctypes
+import logging
+import os
+import selectors
+import signal
 import socket
-import threading
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Which kernel interface drives the echo loop:
+#   selectors — epoll readiness notifications (default, works everywhere)
+#   uring     — io_uring completion queue (Linux 5.19+, see uring.py)
+#   threads   — classic blocking recv/send, one pooled thread per client
+#   asyncio   — asyncio streams; on uvloop (libuv, in C) when it's installed
+IO_BACKEND = os.environ.get("NETLAB_IO_BACKEND", "selectors")
+IO_BACKENDS = ("selectors", "uring", "threads", "asyncio")
+
+# Number of server processes. Each binds its own listening socket to the same
+# port with SO_REUSEPORT and the kernel spreads new connections across them.
+# 0 = one per CPU. Default 1: one process is easier to follow with tcpdump.
+WORKERS = int(os.environ.get("NETLAB_WORKERS", "1")) or os.cpu_count()
+
+# How the selectors backend moves bytes:
+#   copy   — recv() into Python, send() back out (default; lets us print them)
+#   splice — socket → pipe → socket entirely inside the kernel
+ECHO_MODE = os.environ.get("NETLAB_ECHO_MODE", "copy")
+
+# If set, every client is sent this file (via sendfile) instead of an echo
+SERVE_FILE = os.environ.get("NETLAB_SERVE_FILE")
+
+# Per-message logging. Formatting a log line for every recv() — and worse, a
+# hex dump, which touches every byte and allocates a string twice the size —
+# costs more CPU than the echo itself. So per-message lines are DEBUG, and
+# payload dumps need NETLAB_DUMP_HEX=1 on top:
+#   NETLAB_LOG_LEVEL=DEBUG   — log every recv/send
+#   NETLAB_DUMP_HEX=1        — ...plus hex/text of each payload (implies DEBUG)
+DUMP_HEX = os.environ.get("NETLAB_DUMP_HEX") == "1"
+LOG_LEVEL = os.environ.get("NETLAB_LOG_LEVEL", "DEBUG" if DUMP_HEX else "INFO").upper()
+
+log = logging.getLogger(__name__)
+
+# Busy-poll the selector instead of sleeping in epoll_wait(). See wait_ready().
+BUSYWAIT = os.environ.get("NETLAB_BUSYWAIT") == "1"
+
+# user_data tags for io_uring: which operation a CQE belongs to. The
+# connection id and buffer slot go in the upper bits (see tag()) so one
+# 64-bit value identifies all three.
+OP_ACCEPT, OP_RECV, OP_SEND = 1, 2, 3
+
+# Receive buffer size per connection adapts between these two: interactive
+# clients stay at one page, bulk senders grow to 64 KiB per read.
+RECV_MIN = 4096
+RECV_SIZE = 65536
+
+# MSG_ZEROCOPY: the kernel sends straight from our buffer's pages instead of
+# copying them into the socket buffer first. Pinning pages and reporting
+# completion has a fixed cost, so it only pays off above ~10 KiB per send.
+ZEROCOPY_MIN = 10240
+
+# Not all of these are exported by the socket module (values from
+# include/uapi/linux/errqueue.h and asm-generic/socket.h)
+SO_ZEROCOPY = getattr(socket, "SO_ZEROCOPY", 60)
+MSG_ZEROCOPY = getattr(socket, "MSG_ZEROCOPY", 0x4000000)
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+IPV6_RECVERR = getattr(socket, "IPV6_RECVERR", 25)
+SO_EE_ORIGIN_ZEROCOPY = 5
+SO_EE_CODE_ZEROCOPY_COPIED = 1
+
+# Socket buffer size we want available for bulk echo. Linux AUTOTUNES these:
+# each connection starts small (tcp_rmem/tcp_wmem default, ~128 KiB) and
+# grows toward the max as the bandwidth-delay product demands. Setting
+# SO_RCVBUF/SO_SNDBUF by hand switches autotuning OFF for that socket, so we
+# only do it when the autotuning ceiling can't reach this target anyway.
+SOCK_BUF_TARGET = 1 << 20
+
+# SO_RCVLOWAT: don't report the socket readable until this many bytes are
+# queued, so bulk transfers take fewer, fuller reads. Off by default because
+# it stalls small messages: a 5-byte line below the mark is never delivered
+# until more data (or FIN) arrives — fatal for an interactive echo.
+RCVLOWAT = int(os.environ.get("NETLAB_RCVLOWAT", "0"))
+
+
+# Upper bound on back-to-back reads for one client per event loop wakeup
+READS_PER_WAKEUP = 16
+
+# Received-but-not-yet-echoed pieces one client may have queued. Reading
+# continues while a send is stuck (full duplex) until the queue is this long.
+OUT_QUEUE_MAX = 128
+
+# Buffers per io_uring connection: one can be receiving while another sends
+PIPELINE_DEPTH = 2
+
+# accept4(2) isn't exposed by the socket module with caller-chosen flags, so
+# call it from libc directly. None → not available (non-Linux), use accept().
+try:
+    _accept4 = ctypes.CDLL(None, use_errno=True).accept4
+    _accept4.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_uint32),
+                         ctypes.c_int)
+except (OSError, AttributeError):
+    _accept4 = None
+SOCK_NONBLOCK = getattr(socket, "SOCK_NONBLOCK", 0o4000)
+SOCK_CLOEXEC = getattr(socket, "SOCK_CLOEXEC", 0o2000000)
+
+
+def setup_logging():
+    """Plain lines on stdout, like the startup banner prints around them."""
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s", stream=sys.stdout)
+
+
+def dump_payload(data: memoryview):
+    """
+    Hex and text dump of one payload, only when NETLAB_DUMP_HEX=1.
 
+    log.debug("%s", data.hex()) would still compute data.hex() before logging
+    gets to decide the line is disabled — lazy %-formatting only defers the
+    formatting, not the arguments. Hence the explicit isEnabledFor() check.
+    """
+    if DUMP_HEX and log.isEnabledFor(logging.DEBUG):
+        log.debug("    Hex: %s", data.hex())
+        log.debug("    Str: %s", str(data, "utf-8", errors="replace"))
+
+
+def autotune_max(sysctl: str) -> int:
+    """Third field of net.ipv4.tcp_rmem / tcp_wmem: the autotuning ceiling."""
+    try:
+        with open(f"/proc/sys/net/ipv4/{sysctl}") as f:
+            return int(f.read().split()[2])
+    except (OSError, ValueError, IndexError):
+        return 0  # not Linux — assume no autotuning
+
+
+class BufferPool:
+    """
+    Free lists of reusable receive buffers, one list per size.
+
+    recv(n) allocates a brand-new bytes object on every call, and the
+    allocator churn (plus touching fresh memory) shows up on busy connections.
+    recv_into() fills a buffer we already own instead. Because the event loop
+    is single-threaded and a read is normally echoed before the next one, in
+    steady state this hands out the SAME buffer every time. Buffers pinned by
+    zero-copy sends come back only once the kernel releases them.
+    """
+
+    def __init__(self, max_free: int = 64):
+        self._free = {}  # size → [bytearray, ...]
+        self.max_free = max_free
+
+    def get(self, size: int) -> bytearray:
+        free = self._free.get(size)
+        return free.pop() if free else bytearray(size)
+
+    def put(self, buf: bytearray):
+        free = self._free.setdefault(len(buf), [])
+        if len(free) < self.max_free:
+            free.append(buf)
+
+
+BUFFERS = BufferPool()
 
-def handle_client(client_socket: socket.socket, address: tuple):
+
+def accept_new(sel: selectors.BaseSelector, server: socket.socket):
     """
-    Handle a single client connection.
+    Accept every waiting client connection and register each with the selector.
 
     At this point, the 3-way handshake is ALREADY COMPLETE.
     accept() only returns after the kernel finishes SYN → SYN-ACK → ACK.
+    The selector told us the listening socket is readable, which for a
+    listening socket means "the accept queue is non-empty". Rather than take
+    one connection and go back to select(), drain the whole queue now — in a
+    connection storm that's one wakeup for many clients.
+    """
+    while True:
+        try:
+            client_socket, address = accept_nonblocking(server)
+        except BlockingIOError:
+            return  # accept queue is empty
+        except ConnectionAbortedError:
+            continue  # client gave up while it sat in the queue
+        except OSError as e:
+            # EMFILE/ENFILE: out of file descriptors. Leave the rest queued.
+            log.warning("[!] accept failed: %s", e)
+            return
+        register_client(sel, client_socket, address)
+
+
+def accept_nonblocking(server: socket.socket) -> tuple:
+    """
+    accept() a connection whose socket is already non-blocking.
+
+    server.accept() + setblocking(False) costs two syscalls: accept4() and an
+    ioctl(FIONBIO) to flip the new fd to non-blocking. accept4() can return
+    the fd with SOCK_NONBLOCK (and SOCK_CLOEXEC) already set in ONE call.
+    """
+    if _accept4 is None:
+        client_socket, address = server.accept()
+        client_socket.setblocking(False)
+        return client_socket, address
+
+    raw = ctypes.create_string_buffer(128)  # big enough for any sockaddr
+    addrlen = ctypes.c_uint32(len(raw))
+    fd = _accept4(server.fileno(), raw, ctypes.byref(addrlen),
+                  SOCK_NONBLOCK | SOCK_CLOEXEC)
+    if fd < 0:
+        err = ctypes.get_errno()
+        # OSError picks the matching subclass from errno:
+        # EAGAIN → BlockingIOError, ECONNABORTED → ConnectionAbortedError
+        raise OSError(err, os.strerror(err))
+
+    # Passing family/type/proto explicitly stops Python from asking the kernel
+    # (three getsockopt calls); SOCK_NONBLOCK in the type tells it the fd is
+    # already non-blocking, so it won't touch the flag either.
+    client_socket = socket.socket(server.family, server.type | SOCK_NONBLOCK, server.proto,
+                                  fileno=fd)
+    return client_socket, parse_sockaddr(raw.raw[:addrlen.value])
+
+
+def parse_sockaddr(raw: bytes) -> tuple:
+    """Decode a struct sockaddr_in / sockaddr_in6 into (host, port)."""
+    family, = struct.unpack_from("=H", raw)  # host byte order
+    port = int.from_bytes(raw[2:4], "big")  # network byte order
+    if family == socket.AF_INET6:
+        return socket.inet_ntop(socket.AF_INET6, raw[8:24]), port
+    return socket.inet_ntop(socket.AF_INET, raw[4:8]), port
+
+
+def register_client(sel: selectors.BaseSelector, client_socket: socket.socket,
+                    address: tuple):
+    """
+    Set up a freshly accepted (non-blocking) client socket and register it.
 
-    The client_socket is a NEW socket, separate from the listening socket.
+    The client socket is a NEW socket, separate from the listening socket.
     This is how one server can handle many clients — each gets its own socket
     (identified by the 4-tuple: src_ip, src_port, dst_ip, dst_port).
+
+    Non-blocking: recv()/send() return immediately instead of parking the
+    (only) thread. If there's nothing to do they raise BlockingIOError.
     """
-    print(f"[+] Connection from {address[0]}:{address[1]}")
+    log.info("[+] Connection from %s:%d", address[0], address[1])
+
+    # Disable Nagle's algorithm. By default the kernel holds back a small
+    # segment while an earlier one is still un-ACKed, hoping to coalesce it
+    # with more data. The receiver in turn delays its ACK (up to ~40 ms)
+    # hoping to piggyback it on a reply. For request/reply traffic like an
+    # echo, the two wait on each other and every small reply stalls.
+    #
+    # TCP_NODELAY = "send each write immediately". The tradeoff: a program
+    # that writes many tiny pieces now puts each on the wire as its own packet.
+    # We always write a whole reply at once, so latency wins. A bulk-transfer
+    # mode should turn it back off (or cork) until the full payload is queued.
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    if RCVLOWAT:
+        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVLOWAT, RCVLOWAT)
 
+    # Opt in to MSG_ZEROCOPY once per socket. Without this flag the kernel
+    # silently ignores MSG_ZEROCOPY on send().
     try:
-        while True:
-            # recv() is a BLOCKING call. It waits until:
-            #   1. Data arrives (returns the bytes)
-            #   2. Client sends FIN (returns empty bytes b'')
-            #   3. Connection resets (raises an exception)
-            #
-            # The 4096 is the BUFFER SIZE — max bytes to read at once.
-            # TCP is a BYTE STREAM, not a message protocol. A single send()
-            # might arrive as multiple recv() calls, or multiple send() calls
-            # might arrive in a single recv(). There are NO message boundaries.
-            data = client_socket.recv(4096)
-
-            if not data:
-                # Empty bytes = client closed the connection (sent FIN).
-                # The kernel does a 4-way close: FIN → ACK, FIN → ACK
-                print(f"[-] {address[0]}:{address[1]} disconnected")
-                break
+        client_socket.setsockopt(socket.SOL_SOCKET, SO_ZEROCOPY, 1)
+        zerocopy = True
+    except OSError:
+        zerocopy = False  # pre-4.14 kernel or not Linux
 
-            print(f"[<] Received {len(data)} bytes from {address[0]}:{address[1]}")
-            print(f"    Hex: {data.hex()}")
-            print(f"    Str: {data.decode('utf-8', errors='replace')}")
+    # Per-connection state lives in the selector's `data` slot. With one thread
+    # serving every client, this dict replaces what used to be the local
+    # variables of a per-client thread.
+    state = {
+        "addr": address,
+        "outq": collections.deque(),  # (pool buffer or None, memoryview) to echo
+        "zerocopy": zerocopy,
+        "zc_inflight": {},  # zerocopy send number → pieces the kernel still reads
+        "zc_next": 0,
+        "bufsize": RECV_MIN,
+        "full_reads": 0,
+        "short_reads": 0,
+        "eof": False,  # client sent FIN; close once outq has drained
+        "service": service,
+        "fds": [],  # extra fds to close along with the socket
+    }
 
-            # Echo it back — send() pushes bytes into the kernel's send buffer.
-            # The kernel handles segmentation (breaking into MSS-sized chunks),
-            # retransmission, flow control (TCP window), and congestion control.
-            client_socket.sendall(data)
-            print(f"[>] Echoed {len(data)} bytes back")
+    if SERVE_FILE:
+        file_fd = os.open(SERVE_FILE, os.O_RDONLY | os.O_CLOEXEC)
+        state.update(service=service_file, file_fd=file_fd,
+                     offset=0, size=os.fstat(file_fd).st_size)
+        state["fds"].append(file_fd)
+        sel.register(client_socket, selectors.EVENT_WRITE, data=state)
+        return
+
+    if ECHO_MODE == "splice":
+        # splice() needs a pipe on one side, so bounce through our own.
+        # The pipe is just a ring of page references inside the kernel.
+        pipe_r, pipe_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        state.update(service=service_splice, pipe_r=pipe_r, pipe_w=pipe_w, piped=0)
+        state["fds"] += [pipe_r, pipe_w]
+
+    sel.register(client_socket, selectors.EVENT_READ, data=state)
+
+
+def service(sel: selectors.BaseSelector, client_socket: socket.socket, state: dict,
+            mask: int):
+    """
+    Handle one readiness event for a client connection.
+
+    EVENT_READ  → the kernel has bytes (or a FIN) waiting in the receive buffer.
+    EVENT_WRITE → there is room in the send buffer again for data we couldn't
+                  push last time.
+    """
+    address = state["addr"]
 
-    except ConnectionResetError:
+    try:
+        if state["zc_inflight"]:
+            reap_zerocopy(client_socket, state)
+
+        # Reading and sending are decoupled: reads append to the out-queue,
+        # sends drain it. Unlike strict recv → send → recv lockstep, we keep
+        # reading while the peer's side of the pipe is backed up, so both
+        # directions stay busy — up to OUT_QUEUE_MAX queued pieces.
+        outq = state["outq"]
+        if mask & selectors.EVENT_READ and not state["eof"]:
+            # Keep reading while reads come back full (the kernel probably has
+            # more queued), but cap it so one busy client can't starve the
+            # others sharing this thread.
+            for _ in range(min(READS_PER_WAKEUP, OUT_QUEUE_MAX - len(outq))):
+                # recv_into() on a non-blocking socket copies whatever is in
+                # the kernel receive buffer right now into OUR buffer, up to
+                # its size, and returns the byte count. It never waits, and
+                # unlike recv() it doesn't allocate a new bytes object.
+                #
+                # TCP is a BYTE STREAM, not a message protocol. A single send()
+                # might arrive as multiple recv() calls, or multiple send()
+                # calls might arrive in a single recv(). There are NO message
+                # boundaries.
+                buf = BUFFERS.get(state["bufsize"])
+                try:
+                    n = client_socket.recv_into(buf)
+                except BlockingIOError:
+                    # Nothing (more) to read right now.
+                    BUFFERS.put(buf)
+                    break
+
+                if not n:
+                    # Zero bytes = client closed its side (sent FIN). It may
+                    # only have half-closed and still be reading, so finish
+                    # echoing what's queued before closing ours.
+                    BUFFERS.put(buf)
+                    state["eof"] = True
+                    break
+
+                full = n == len(buf)
+                state["bufsize"] = next_bufsize(state, n)
+
+                # A memoryview slice is a window onto buf — no copy
+                data = memoryview(buf)[:n]
+                log.debug("[<] Received %d bytes from %s:%d", n, address[0], address[1])
+                dump_payload(data)
+                outq.append((buf, data))
+
+                if not full:
+                    break
+
+        # Echo it back — send() pushes bytes into the kernel's send buffer.
+        # The kernel handles segmentation (breaking into MSS-sized chunks),
+        # retransmission, flow control (TCP window), and congestion control.
+        #
+        # sendall() is not an option on a non-blocking socket: if the send
+        # buffer fills halfway through, it raises and we lose track of how much
+        # went out. Instead we send what fits and leave the rest queued.
+        if outq:
+            flush_queue(client_socket, state)
+
+        if state["eof"] and not outq:
+            # The kernel does a 4-way close: FIN → ACK, FIN → ACK
+            log.info("[-] %s:%d disconnected", address[0], address[1])
+            close_client(sel, client_socket)
+            return
+
+        # EVENT_WRITE while anything is queued. EVENT_READ until the queue is
+        # full (or the client has sent FIN) — then stop reading and let the
+        # send buffer drain. This is backpressure: without it a fast sender
+        # could make us buffer unbounded data for a slow reader.
+        events = 0
+        if len(outq) < OUT_QUEUE_MAX and not state["eof"]:
+            events |= selectors.EVENT_READ
+        if outq:
+            events |= selectors.EVENT_WRITE
+        if sel.get_key(client_socket).events != events:
+            sel.modify(client_socket, events, data=state)
+
+    except (ConnectionResetError, BrokenPipeError):
         # Client crashed or sent RST (reset) instead of a clean FIN close
-        print(f"[!] Connection reset by {address[0]}:{address[1]}")
-    finally:
-        client_socket.close()
+        log.info("[!] Connection reset by %s:%d", address[0], address[1])
+        close_client(sel, client_socket)
+
+
+def service_file(sel: selectors.BaseSelector, client_socket: socket.socket, state: dict,
+                 mask: int):
+    """
+    Stream SERVE_FILE to the client with sendfile(2).
+
+    The naive way — f.read() then sock.send() — copies every byte twice:
+    page cache → Python bytes → socket buffer. sendfile() tells the kernel
+    "move bytes from this file to that socket" and the data never leaves the
+    kernel: pages go from the page cache straight to the socket.
+
+    (socket.sendfile() wraps the same syscall, but only for blocking sockets.
+    On a non-blocking one we call os.sendfile() each time there's room.)
+    """
+    address = state["addr"]
+    try:
+        while state["offset"] < state["size"]:
+            sent = os.sendfile(client_socket.fileno(), state["file_fd"], state["offset"],
+                               state["size"] - state["offset"])
+            if sent == 0:
+                break  # file shrank underneath us
+            state["offset"] += sent
+    except BlockingIOError:
+        return  # send buffer full — wait for the next EVENT_WRITE
+    except (ConnectionResetError, BrokenPipeError):
+        log.info("[!] Connection reset by %s:%d", address[0], address[1])
+        close_client(sel, client_socket)
+        return
+
+    log.info("[>] Sent %d bytes of %s to %s:%d (sendfile)",
+             state["offset"], SERVE_FILE, address[0], address[1])
+    close_client(sel, client_socket)
+
+
+def service_splice(sel: selectors.BaseSelector, client_socket: socket.socket, state: dict,
+                   mask: int):
+    """
+    Echo with splice(2): socket → pipe → same socket, no userspace copy.
+
+    recv()+send() copies each byte into a Python object and back out again.
+    splice() moves *page references* between a file descriptor and a pipe,
+    so the payload never crosses into Python at all — which also means we
+    can't print it. The same two calls work as a zero-copy proxy between
+    two different sockets.
+    """
+    address = state["addr"]
+    sock_fd = client_socket.fileno()
+    try:
+        if mask & selectors.EVENT_READ:
+            try:
+                moved = os.splice(sock_fd, state["pipe_w"], RECV_SIZE,
+                                  flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+            except BlockingIOError:
+                moved = None
+            if moved == 0:
+                log.info("[-] %s:%d disconnected", address[0], address[1])
+                close_client(sel, client_socket)
+                return
+            if moved:
+                state["piped"] += moved
+                log.debug("[<] Spliced %d bytes from %s:%d into pipe",
+                          moved, address[0], address[1])
+
+        if state["piped"]:
+            # SPLICE_F_MORE is splice's MSG_MORE: if the pipe is still full
+            # after this, hint the kernel to hold the segment for more data.
+            flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+            if state["piped"] >= RECV_SIZE:
+                flags |= os.SPLICE_F_MORE
+            try:
+                moved = os.splice(state["pipe_r"], sock_fd, state["piped"], flags=flags)
+            except BlockingIOError:
+                moved = 0
+            state["piped"] -= moved
+            if moved:
+                log.debug("[>] Spliced %d bytes back out", moved)
+
+        events = selectors.EVENT_WRITE if state["piped"] else selectors.EVENT_READ
+        if sel.get_key(client_socket).events != events:
+            sel.modify(client_socket, events, data=state)
+
+    except (ConnectionResetError, BrokenPipeError):
+        log.info("[!] Connection reset by %s:%d", address[0], address[1])
+        close_client(sel, client_socket)
+
+
+def next_bufsize(state: dict, n: int) -> int:
+    """
+    Pick the next receive buffer size from how full this read was.
+
+    Repeated full reads mean a bulk sender: double the buffer so each
+    syscall moves more. A long run of mostly-empty reads means an
+    interactive client: halve it so idle connections don't hold 64 KiB.
+    """
+    size = state["bufsize"]
+    if n == size:
+        state["full_reads"] += 1
+        state["short_reads"] = 0
+        if state["full_reads"] >= 2 and size < RECV_SIZE:
+            state["full_reads"] = 0
+            return size * 2
+    elif n <= size // 4:
+        state["short_reads"] += 1
+        state["full_reads"] = 0
+        if state["short_reads"] >= 16 and size > RECV_MIN:
+            state["short_reads"] = 0
+            return size // 2
+    else:
+        state["full_reads"] = state["short_reads"] = 0
+    return size
+
+
+def flush_queue(client_socket: socket.socket, state: dict):
+    """
+    Send as much of the out-queue as the kernel will take, with ONE call.
+
+    sendmsg() takes a list of buffers and hands them to the kernel as an
+    iovec, exactly like writev(2): one syscall for all the queued pieces, and
+    no b"".join() copy to glue them together first. The kernel packs
+    full-size segments across buffer boundaries by itself.
+
+    Fully sent pieces leave the queue. A partly sent head piece stays, sliced
+    past what went out.
+    """
+    outq = state["outq"]
+    sent, pinned = send_views(client_socket, state, [view for _, view in outq])
+    if not sent:
+        return
+    zc = " (MSG_ZEROCOPY)" if pinned else ""
+    log.debug("[>] Echoed %d bytes back%s", sent, zc)
+
+    done = []
+    while outq and sent >= len(outq[0][1]):
+        sent -= len(outq[0][1])
+        done.append(outq.popleft())
+    if sent:
+        buf, view = outq[0]
+        if pinned:
+            # The kernel holds the sent part of buf until its notification.
+            # Hand the whole buffer to the notification and keep a private
+            # copy of the small unsent tail, so buf can't go back to the pool
+            # while we still need it.
+            done.append((buf, view))
+            outq[0] = (None, memoryview(bytes(view[sent:])))
+        else:
+            outq[0] = (buf, view[sent:])
+
+    if pinned:
+        # Each successful zero-copy send gets the next sequence number;
+        # notifications report ranges of these numbers. The views keep any
+        # private copies alive until then.
+        state["zc_inflight"][state["zc_next"]] = done
+        state["zc_next"] = (state["zc_next"] + 1) & 0xFFFFFFFF
+    else:
+        for buf, _ in done:
+            if buf is not None:
+                BUFFERS.put(buf)
+
+
+def send_views(client_socket: socket.socket, state: dict, views: list) -> tuple:
+    """
+    sendmsg() the views, zero-copy if they're large enough.
+
+    Returns (bytes sent, whether the buffers are now pinned by the kernel).
+
+    A normal send copies our bytes into kernel memory and returns — we may
+    reuse the buffers immediately. With MSG_ZEROCOPY the kernel pins our pages
+    and the NIC reads them directly, so the buffers must stay untouched until
+    the kernel says it's done (a notification on the socket's error queue).
+    That's why they go into zc_inflight instead of back to the pool.
+    """
+    if state["zerocopy"] and sum(len(v) for v in views) >= ZEROCOPY_MIN:
+        try:
+            return client_socket.sendmsg(views, [], MSG_ZEROCOPY), True
+        except BlockingIOError:
+            return 0, False
+        except OSError:
+            # ENOBUFS: over the per-socket limit of pinned memory
+            # (optmem_max). Just take the copying path for this one.
+            pass
+
+    try:
+        return client_socket.sendmsg(views), False
+    except BlockingIOError:
+        return 0, False
+
+
+def reap_zerocopy(client_socket: socket.socket, state: dict):
+    """
+    Release buffers the kernel has finished sending from.
+
+    Completions arrive on the socket's ERROR QUEUE (the same channel ICMP
+    errors use), read with recvmsg(MSG_ERRQUEUE). A pending error queue also
+    makes epoll report the socket, which is what wakes us up for this.
+    """
+    while state["zc_inflight"]:
+        try:
+            _, ancdata, _, _ = client_socket.recvmsg(0, 256, socket.MSG_ERRQUEUE)
+        except BlockingIOError:
+            return
+
+        for level, ctype, cdata in ancdata:
+            if (level, ctype) not in ((socket.IPPROTO_IP, IP_RECVERR),
+                                      (socket.IPPROTO_IPV6, IPV6_RECVERR)):
+                continue
+            # struct sock_extended_err: ee_info..ee_data is the range of
+            # zero-copy send numbers that just completed.
+            _, origin, _, code, _, lo, hi = struct.unpack_from("=IBBBBII", cdata)
+            if origin != SO_EE_ORIGIN_ZEROCOPY:
+                continue
+            for seq in range(lo, hi + 1):
+                for buf, _ in state["zc_inflight"].pop(seq, ()):
+                    if buf is not None:
+                        BUFFERS.put(buf)
+            if code & SO_EE_CODE_ZEROCOPY_COPIED and state["zerocopy"]:
+                # The kernel had to copy after all (always the case over
+                # loopback). Zero-copy is pure overhead then — stop using it.
+                log.info("[*] Kernel copied zero-copy sends to %s, disabling",
+                         state["addr"][0])
+                state["zerocopy"] = False
+
+
+def close_client(sel: selectors.BaseSelector, client_socket: socket.socket):
+    # Always unregister BEFORE close(): once closed, the fd number can be
+    # reused by the next accept() and the selector would confuse the two.
+    # Buffers still in zc_inflight are NOT returned to the pool: the kernel
+    # may read them until the socket's last segment is gone.
+    state = sel.unregister(client_socket).data
+    for fd in state["fds"]:
+        os.close(fd)
+    client_socket.close()
 
 
 def main():
+    check_io_backend()
+    setup_logging()
+    run_workers(serve_forever, WORKERS)
+
+
+def check_io_backend():
+    """Exit with a message if NETLAB_IO_BACKEND names no backend we have."""
+    # A typo ("io_uring", "thread") would otherwise quietly run selectors
+    # and a benchmark would measure the wrong thing.
+    if IO_BACKEND not in IO_BACKENDS:
+        print(f"[!] Unknown NETLAB_IO_BACKEND={IO_BACKEND!r}, "
+              f"expected one of: {', '.join(IO_BACKENDS)}")
+        sys.exit(1)
+
+
+def run_workers(serve, workers: int):
+    """
+    Run serve() in `workers` forked processes (or inline if just one).
+
+    One Python process uses one core no matter how many connections it has —
+    the GIL serializes the interpreter, and a single listening socket funnels
+    every accept() through it. Instead, fork N processes that each create
+    their OWN listening socket on the same port with SO_REUSEPORT. The kernel
+    hashes each incoming connection's 4-tuple to pick a socket, so accepts
+    and the connections themselves are spread over N independent event loops
+    with zero coordination between them.
+
+    Anything built before the fork (e.g. tls_server's SSLContext with its
+    parsed certificate) is shared copy-on-write instead of rebuilt N times.
+    """
+    if workers <= 1:
+        serve()
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # Child: run one event loop and never return into the parent's code
+            try:
+                serve()
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f"[*] Forked {workers} workers: {children}")
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    # k8s stops a pod with SIGTERM to PID 1 — pass it on so workers exit too.
+    # (Ctrl+C in a terminal already reaches the whole process group.)
+    signal.signal(signal.SIGTERM, forward)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        forward(signal.SIGINT, None)
+        for pid in children:
+            os.waitpid(pid, 0)
+
+
+def serve_forever():
     # AF_INET  = IPv4 (vs AF_INET6 for IPv6)
     # SOCK_STREAM = TCP (vs SOCK_DGRAM for UDP)
     #
@@ -105,6 +769,24 @@ def main():
     # same port and corrupt its data stream.
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
+    # SO_REUSEPORT lets several sockets bind the SAME address:port, and the
+    # kernel load-balances new connections between them (see run_workers).
+    # Only with multiple workers — otherwise a second copy of the server
+    # started by accident would silently steal half the connections.
+    if WORKERS > 1:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    # Socket buffers. Set on the LISTENING socket, before listen(): accepted
+    # sockets inherit them, and the receive buffer size at SYN time decides
+    # the TCP window scale we advertise — raising SO_RCVBUF after accept()
+    # can't widen a window scale that was already negotiated.
+    #
+    # The kernel doubles whatever we ask for (half is bookkeeping overhead)
+    # and caps it at net.core.rmem_max / wmem_max.
+    for opt, sysctl in ((socket.SO_RCVBUF, "tcp_rmem"), (socket.SO_SNDBUF, "tcp_wmem")):
+        if autotune_max(sysctl) < SOCK_BUF_TARGET:
+            server.setsockopt(socket.SOL_SOCKET, opt, SOCK_BUF_TARGET)
+
     # bind() tells the kernel: "I want to receive packets sent to this address:port"
     #
     # "0.0.0.0" means ALL interfaces. If you used "127.0.0.1" instead, the
@@ -117,36 +799,474 @@ def main():
     # listen() marks the socket as PASSIVE — it will accept incoming connections
     # rather than initiate outgoing ones.
     #
-    # The argument (5) is the BACKLOG — how many completed connections can wait
+    # The argument is the BACKLOG — how many completed connections can wait
     # in the accept queue before the kernel starts dropping SYN packets.
     # Under the hood, there are actually TWO queues:
     #   1. SYN queue — connections mid-handshake (got SYN, sent SYN-ACK, waiting for ACK)
     #   2. Accept queue — fully established connections waiting for accept()
-    server.listen(5)
-    print(f"[*] TCP Echo Server listening on {host}:{port}")
+    #
+    # A dropped SYN isn't an error the client sees — it retransmits after 1 s
+    # (then 3 s, 7 s...). So a tiny backlog turns a burst of connects into
+    # second-long stalls (watch ListenOverflows in `nstat -az TcpExt*Listen*`).
+    # SOMAXCONN asks for the largest queue allowed; the kernel caps it at
+    # net.core.somaxconn (4096 on current kernels).
+    server.listen(socket.SOMAXCONN)
+    print(f"[*] TCP Echo Server listening on {host}:{port} (pid {os.getpid()})")
     print(f"[*] Try: python tcp_client.py")
     print(f"[*] Or:  nc localhost {port}")
     print(f"[*] Watch packets: sudo tcpdump -i lo -nn port {port}")
 
     try:
-        while True:
-            # accept() blocks until a client completes the 3-way handshake.
-            # Returns a NEW socket for this specific connection + the client's address.
-            client_socket, address = server.accept()
-
-            # Spawn a thread per connection. This is the simplest concurrency model.
-            # Production servers use: select/poll/epoll (event loop), or async/await.
-            thread = threading.Thread(
-                target=handle_client,
-                args=(client_socket, address),
-                daemon=True,
-            )
-            thread.start()
+        if IO_BACKEND == "uring":
+            serve_uring(server)
+        elif IO_BACKEND == "threads":
+            serve_threads(server)
+        elif IO_BACKEND == "asyncio":
+            serve_asyncio(server)
+        else:
+            serve_selectors(server)
     except KeyboardInterrupt:
         print("\n[*] Shutting down")
     finally:
         server.close()
 
 
+def wait_ready(sel: selectors.BaseSelector) -> list:
+    """
+    sel.select(), optionally without ever going to sleep.
+
+    A blocking epoll_wait() puts the thread to sleep; when a packet arrives
+    the kernel has to wake it and the scheduler has to switch it back in —
+    several microseconds on every message. With NETLAB_BUSYWAIT=1 we poll
+    with timeout=0 in a tight loop instead, so the thread is already running
+    when data lands. Minimum latency, at the cost of 100% of a CPU even with
+    zero clients. Benchmark-only: it's hostile to anything else sharing the
+    machine.
+
+    Python can't issue a PAUSE instruction between polls; sched_yield() is
+    the nearest thing. It lets another runnable task on this core go first —
+    on a one-CPU box that's probably the client we're waiting for.
+    """
+    if not BUSYWAIT:
+        return sel.select()
+    while True:
+        events = sel.select(timeout=0)
+        if events:
+            return events
+        os.sched_yield()
+
+
+def serve_selectors(server: socket.socket):
+    # Instead of one thread per client, ONE thread waits on ALL sockets at once.
+    # DefaultSelector picks the best mechanism the OS offers: epoll on Linux,
+    # kqueue on macOS/BSD, plain select() elsewhere.
+    #
+    # epoll_wait() sleeps until at least one registered fd is "ready" (has data
+    # to read, or room to write), then returns just the ready ones. Thousands of
+    # idle connections cost nothing — no thread stacks, no context switches.
+    sel = selectors.DefaultSelector()
+    server.setblocking(False)
+    sel.register(server, selectors.EVENT_READ, data=None)
+
+    try:
+        while True:
+            for key, mask in wait_ready(sel):
+                if key.data is None:
+                    # The listening socket is readable → a client finished the
+                    # 3-way handshake and is waiting in the accept queue.
+                    accept_new(sel, key.fileobj)
+                else:
+                    key.data["service"](sel, key.fileobj, key.data, mask)
+    finally:
+        sel.close()
+
+
+def serve_threads(server: socket.socket):
+    """
+    The textbook alternative to an event loop: blocking sockets, one thread
+    per client — but taken from a BOUNDED pool.
+
+    Spawning a fresh threading.Thread per connection has no upper limit: a
+    connection spike means hundreds of OS threads, each with its own stack,
+    until ulimit -u says no — and long before that, the CPU spends its time
+    context-switching between them. A pool caps concurrency and reuses
+    threads. Past max_workers, new clients wait in the executor's queue
+    (connected, but not served until a thread frees up) instead of costing
+    memory.
+    """
+    pool = ThreadPoolExecutor(max_workers=min(32, os.cpu_count() * 4),
+                              thread_name_prefix="echo")
+    clients = set()
+
+    try:
+        while True:
+            # Blocks until a client is in the accept queue
+            try:
+                client_socket, address = server.accept()
+            except ConnectionAbortedError:
+                continue  # client gave up while it sat in the queue
+            except OSError as e:
+                # EMFILE/ENFILE: out of file descriptors. The connection stays
+                # queued, so an immediate retry would just fail again — give
+                # the pool a moment to close some sockets first.
+                log.warning("[!] accept failed: %s", e)
+                time.sleep(0.1)
+                continue
+            clients.add(client_socket)
+            pool.submit(handle_client, client_socket, address, clients)
+    finally:
+        # Pool threads are sitting in blocking recv() calls; shutting the
+        # sockets down makes those return 0 so the threads can finish.
+        for client_socket in list(clients):
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def serve_asyncio(server: socket.socket, ssl_context=None):
+    """
+    The event loop again — but asyncio's, with coroutines instead of state.
+
+    Under the hood it's the same epoll loop as serve_selectors(). What changes
+    is how per-connection state is kept: each client is one coroutine, and
+    its local variables ARE its state, where our hand-written loop needs a
+    dict per socket and explicit read/write interest switching.
+
+    uvloop is an optional drop-in loop written in C on top of libuv (the
+    engine behind Node.js). Same code, noticeably less per-event overhead.
+    Without it, the standard library's pure-Python loop runs instead.
+
+    With ssl_context, asyncio drives the TLS handshake and record layer
+    itself, non-blockingly, with the same SSLObject + MemoryBIO technique as
+    tls_server.py.
+    """
+    import asyncio
+    try:
+        import uvloop
+        loop_factory = uvloop.new_event_loop
+    except ImportError:
+        loop_factory = None
+    print(f"[*] Using asyncio backend ({'uvloop' if loop_factory else 'default loop'})")
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # asyncio already sets TCP_NODELAY on every TCP connection it creates
+        address = writer.get_extra_info("peername")
+        tls = writer.get_extra_info("ssl_object")
+        if tls is None:
+            log.info("[+] Connection from %s:%d", address[0], address[1])
+        else:
+            cipher, _, bits = tls.cipher()
+            log.info("[+] TLS connection from %s:%d", address[0], address[1])
+            log.info("    Protocol: %s", tls.version())
+            log.info("    Cipher:   %s (%d-bit)", cipher, bits)
+
+        try:
+            while True:
+                # Suspends this coroutine (not the thread) until data arrives
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    log.info("[-] %s:%d disconnected", address[0], address[1])
+                    break
+                log.debug("[<] Received %d bytes from %s:%d",
+                          len(data), address[0], address[1])
+                dump_payload(memoryview(data))
+
+                # write() queues the bytes and returns at once; drain() only
+                # waits if the transport's buffer is over its high-water mark
+                # — the same backpressure as our EVENT_WRITE switching.
+                writer.write(data)
+                await writer.drain()
+                log.debug("[>] Echoed %d bytes back", len(data))
+        except (ConnectionResetError, BrokenPipeError):
+            log.info("[!] Connection reset by %s:%d", address[0], address[1])
+        finally:
+            writer.close()
+
+    async def serve():
+        # sock= hands over our already-bound, listening socket
+        async with await asyncio.start_server(handle, sock=server, ssl=ssl_context) as srv:
+            await srv.serve_forever()
+
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(serve())
+
+
+def handle_client(client_socket: socket.socket, address: tuple, clients: set):
+    """
+    Blocking echo for one client, run on a pool thread.
+
+    recv() parks the thread until data arrives; sendall() parks it until the
+    kernel has taken every byte. Simple — the price is a whole thread per
+    connected client, idle or not.
+    """
+    log.info("[+] Connection from %s:%d", address[0], address[1])
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    buf = bytearray(RECV_SIZE)
+
+    try:
+        while True:
+            n = client_socket.recv_into(buf)
+            if not n:
+                log.info("[-] %s:%d disconnected", address[0], address[1])
+                break
+            data = memoryview(buf)[:n]
+            log.debug("[<] Received %d bytes from %s:%d", n, address[0], address[1])
+            dump_payload(data)
+            client_socket.sendall(data)
+            log.debug("[>] Echoed %d bytes back", n)
+    except (ConnectionResetError, BrokenPipeError):
+        log.info("[!] Connection reset by %s:%d", address[0], address[1])
+    finally:
+        clients.discard(client_socket)
+        client_socket.close()
+
+
+def serve_uring(server: socket.socket):
+    """
+    The same echo loop, driven by io_uring completions instead of epoll.
+
+    With epoll we ask "which sockets are ready?" and then make the recv/send
+    syscalls ourselves. With io_uring we queue the recv/send operations up
+    front and the kernel tells us when they've FINISHED. The loop below makes
+    exactly one syscall per iteration — io_uring_enter() — no matter how many
+    clients had activity.
+    """
+    try:
+        import uring
+
+        # SINGLE_ISSUER + DEFER_TASKRUN (6.1+): completion work runs only when
+        # we call io_uring_enter(), on our thread, instead of interrupting us.
+        # Older kernels reject these flags with EINVAL, so retry without them.
+        try:
+            ring = uring.Ring(256, uring.IORING_SETUP_COOP_TASKRUN
+                              | uring.IORING_SETUP_SINGLE_ISSUER
+                              | uring.IORING_SETUP_DEFER_TASKRUN)
+        except OSError:
+            ring = uring.Ring(256)
+    except (ImportError, OSError) as e:
+        # Kernel too old, or io_uring blocked by seccomp (Docker's default
+        # profile does this) — epoll always works.
+        print(f"[!] io_uring unavailable ({e}), falling back to selectors")
+        return serve_selectors(server)
+    print(f"[*] Using io_uring backend (ring fd {ring.fd})")
+
+    listen_fd = server.fileno()
+    # IORING_OP_SEND_ZC (6.0+) is io_uring's MSG_ZEROCOPY. Turned off if the
+    # kernel rejects it.
+    send_zc = True
+
+    # Multishot accept (5.19+): ONE submission keeps producing a CQE per new
+    # connection, instead of re-arming accept after every client.
+    multishot = True
+    ring.prep_accept(listen_fd, OP_ACCEPT, multishot=multishot)
+
+    # Connections are tagged with an ever-increasing id rather than their fd:
+    # a late zero-copy notification must not be mistaken for a new client
+    # that happened to get the same fd number after a close.
+    clients = {}  # conn id → per-connection state
+    next_id = 1
+
+    # Each connection owns PIPELINE_DEPTH buffers ("slots"). While one slot's
+    # echo is being sent, a RECV into another is already in flight — the
+    # kernel fills the next buffer while the previous one goes out, instead
+    # of strict recv → send → recv ping-pong. Sends go out one at a time, in
+    # the order the data arrived.
+    def arm_recv(conn_id: int, state: dict):
+        if not state["recving"] and not state["eof"] and state["free"]:
+            slot = state["free"].popleft()
+            buf, addr = state["slots"][slot]["buf"], state["slots"][slot]["addr"]
+            ring.prep_recv(state["fd"], addr, len(buf), tag(conn_id, slot, OP_RECV))
+            state["recving"] = True
+
+    def arm_send(conn_id: int, state: dict):
+        if not state["sending"] and state["sendq"]:
+            slot, length = state["sendq"][0]
+            prep_echo_send(ring, tag(conn_id, slot, OP_SEND), state["fd"],
+                           state["slots"][slot]["addr"] + state["sent"],
+                           length - state["sent"], send_zc)
+            state["sending"] = True
+
+    def drop(conn_id: int):
+        state = clients[conn_id]
+        if not state["closed"]:
+            # shutdown() only: it makes every operation still queued in the
+            # ring complete with an error. The fd itself stays open — a SEND
+            # re-armed earlier in this batch may not have been submitted yet,
+            # and if close() freed the number, a new client accepted in the
+            # meantime could get it and receive this connection's bytes.
+            try:
+                state["sock"].shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            state["closed"] = True
+        # Operations still in flight will complete (with an error) later, and
+        # a zero-copy send's buffer may be read by the kernel until its NOTIF
+        # arrives — keep the state (and the fd) around until all of them are
+        # back.
+        if not (state["recving"] or state["sending"]
+                or any(slot["notifs"] for slot in state["slots"])):
+            del clients[conn_id]
+            state["sock"].close()
+            for slot in state["slots"]:
+                BUFFERS.put(slot["buf"])
+
+    try:
+        while True:
+            # Submit everything queued while handling the previous batch, and
+            # sleep until at least one operation completes.
+            ring.submit(wait_nr=1)
+
+            # Drain EVERY completion before submitting again — the new
+            # operations we queue here all go out in the next single enter().
+            for user_data, res, flags in ring.completions():
+                conn_id, slot, op = user_data >> 8, user_data >> 4 & 0xF, user_data & 0xF
+
+                if op == OP_ACCEPT:
+                    if res == -22 and multishot:  # EINVAL: kernel has no multishot accept
+                        multishot = False
+                    elif res >= 0:
+                        # res is the new connection's fd (the 3-way handshake
+                        # is already complete, exactly like accept()).
+                        client_socket = socket.socket(fileno=res)
+                        try:
+                            client_socket.setsockopt(socket.IPPROTO_TCP,
+                                                     socket.TCP_NODELAY, 1)
+                            if RCVLOWAT:
+                                client_socket.setsockopt(socket.SOL_SOCKET,
+                                                         socket.SO_RCVLOWAT, RCVLOWAT)
+                            address = client_socket.getpeername()
+                        except OSError as e:
+                            # The peer reset the connection before we got to it (ENOTCONN
+                            # from getpeername()). Only this connection is gone.
+                            log.info("[!] Connection dropped before setup: %s", e)
+                            client_socket.close()
+                        else:
+                            log.info("[+] Connection from %s:%d", address[0], address[1])
+                            slots = []
+                            for _ in range(PIPELINE_DEPTH):
+                                buf = BUFFERS.get(RECV_SIZE)
+                                addr, keepalive = uring.buffer_address(buf)
+                                slots.append({"buf": buf, "addr": addr,
+                                              "keepalive": keepalive,
+                                              "notifs": 0, "queued": False})
+                            conn_id, next_id = next_id, next_id + 1
+                            state = {"sock": client_socket, "fd": res, "addr": address,
+                                     "slots": slots,
+                                     "free": collections.deque(range(PIPELINE_DEPTH)),
+                                     # (slot, length) pairs still to echo
+                                     "sendq": collections.deque(),
+                                     "sent": 0,  # bytes of sendq[0] already sent
+                                     "recving": False, "sending": False, "closed": False,
+                                     "eof": False}  # FIN seen; close when sendq drains
+                            clients[conn_id] = state
+                            arm_recv(conn_id, state)
+                    else:
+                        log.warning("[!] accept failed: %s", os.strerror(-res))
+                    if not flags & uring.IORING_CQE_F_MORE:
+                        # Single-shot accept (or multishot was terminated) — re-arm
+                        ring.prep_accept(listen_fd, OP_ACCEPT, multishot=multishot)
+                    continue
+
+                state = clients[conn_id]
+                address = state["addr"]
+                slot_state = state["slots"][slot]
+
+                if op == OP_RECV:
+                    state["recving"] = False
+                    if state["closed"]:
+                        drop(conn_id)
+                        continue
+                    if res == 0 and (state["sendq"] or state["sending"]):
+                        # FIN, but echoes are still queued — a half-closed
+                        # client is waiting for them. Stop receiving and
+                        # close once the last send completes.
+                        state["eof"] = True
+                        continue
+                    if res <= 0:
+                        if res == 0:
+                            log.info("[-] %s:%d disconnected", address[0], address[1])
+                        else:
+                            log.info("[!] Connection reset by %s:%d",
+                                     address[0], address[1])
+                        drop(conn_id)
+                        continue
+
+                    data = memoryview(slot_state["buf"])[:res]
+                    log.debug("[<] Received %d bytes from %s:%d",
+                              res, address[0], address[1])
+                    dump_payload(data)
+                    del data
+
+                    # Echo straight out of the same buffer the kernel filled,
+                    # and start receiving into the next free one right away
+                    slot_state["queued"] = True
+                    state["sendq"].append((slot, res))
+                    arm_send(conn_id, state)
+                    arm_recv(conn_id, state)
+
+                elif op == OP_SEND:
+                    if flags & uring.IORING_CQE_F_NOTIF:
+                        # Zero-copy notification: the kernel has let go of the
+                        # buffer. Only now is it safe to recv() into it again.
+                        slot_state["notifs"] -= 1
+                        if state["closed"]:
+                            drop(conn_id)
+                        elif not slot_state["notifs"] and not slot_state["queued"]:
+                            state["free"].append(slot)
+                            arm_recv(conn_id, state)
+                        continue
+                    if flags & uring.IORING_CQE_F_MORE:
+                        slot_state["notifs"] += 1  # a NOTIF CQE will follow
+                    state["sending"] = False
+                    if state["closed"]:
+                        drop(conn_id)
+                        continue
+                    if res == -22 and send_zc:  # EINVAL: kernel has no SEND_ZC
+                        send_zc = False
+                        arm_send(conn_id, state)
+                        continue
+                    if res < 0:
+                        log.info("[!] Connection reset by %s:%d", address[0], address[1])
+                        drop(conn_id)
+                        continue
+
+                    state["sent"] += res
+                    length = state["sendq"][0][1]
+                    if state["sent"] == length:
+                        log.debug("[>] Echoed %d bytes back", length)
+                        state["sendq"].popleft()
+                        state["sent"] = 0
+                        slot_state["queued"] = False
+                        if state["eof"] and not state["sendq"]:
+                            log.info("[-] %s:%d disconnected", address[0], address[1])
+                            drop(conn_id)
+                            continue
+                        if not slot_state["notifs"]:
+                            state["free"].append(slot)
+                            arm_recv(conn_id, state)
+                    # Short send (send buffer full) → the rest of this slot;
+                    # otherwise the next filled slot, if any
+                    arm_send(conn_id, state)
+    finally:
+        for state in clients.values():
+            state["sock"].close()
+        ring.close()
+
+
+def tag(conn_id: int, slot: int, op: int) -> int:
+    """user_data for an io_uring operation: connection id | buffer slot | op."""
+    return conn_id << 8 | slot << 4 | op
+
+
+def prep_echo_send(ring, user_data: int, fd: int, addr: int, length: int, send_zc: bool):
+    """Queue a SEND (or SEND_ZC for large payloads) from a connection's buffer."""
+    if send_zc and length >= ZEROCOPY_MIN:
+        ring.prep_send_zc(fd, addr, length, user_data)
+    else:
+        ring.prep_send(fd, addr, length, user_data)
+
+
 if __name__ == "__main__":
     main()
@@ -36,6 +36,9 @@ EXPERIMENTS TO TRY:
 
   4. Inspect the handshake with openssl:
      openssl s_client -connect localhost:9443 -CAfile certs/ca.crt -state
+
+  5. Benchmark over a pool of resumed sessions:
+     NETLAB_CLIENT_MODE=bench python tls_client.py
 """
 
 import socket
@@ -43,9 +46,44 @@ import ssl
 import sys
 import os
 
+from tcp_client import BENCH_CONNS, CLIENT_MODE, ConnectionPool, recv_exact, run_bench
+
 CERT_DIR = os.path.join(os.path.dirname(__file__), "certs")
 
 
+class TLSConnectionPool(ConnectionPool):
+    """
+    ConnectionPool whose connections resume one TLS session.
+
+    A full handshake means an ECDHE key exchange plus a certificate chain to
+    verify — by far the most expensive thing a TLS client does. After the
+    first handshake the server sends session tickets (NewSessionTicket, RFC
+    8446 PSK). Handing that ticket to the next wrap_socket(session=...) lets
+    it resume: no certificate, no signature checks.
+
+    All connections share one SSLContext — the loaded CA store and settings
+    are built once, not per connection.
+    """
+
+    def __init__(self, host: str, port: int, context: ssl.SSLContext, size: int = 16):
+        self.context = context
+        self.session = None
+        self.resumed = 0
+        super().__init__(host, port, size)
+
+    def connect(self) -> ssl.SSLSocket:
+        tls_socket = self.context.wrap_socket(super().connect(), server_hostname=self.host,
+                                              session=self.session)
+        self.resumed += tls_socket.session_reused
+        if self.session is None:
+            # TLS 1.3 tickets arrive AFTER the handshake, and the client only
+            # processes them on its next read. One tiny echo fetches them.
+            tls_socket.sendall(b"\n")
+            recv_exact(tls_socket, bytearray(1))
+            self.session = tls_socket.session
+        return tls_socket
+
+
 def main():
     host = sys.argv[1] if len(sys.argv) > 1 else "localhost"
     port = int(sys.argv[2]) if len(sys.argv) > 2 else 9443
@@ -66,6 +104,11 @@ def main():
     context.load_verify_locations(ca_cert)
     print(f"[*] Loaded CA certificate: {ca_cert}")
 
+    if CLIENT_MODE == "bench":
+        pool = run_bench(lambda size: TLSConnectionPool(host, port, context, size))
+        print(f"[*] {pool.resumed} of {BENCH_CONNS} handshakes resumed a session")
+        return
+
     # Step 3: Create TCP socket and wrap with TLS
     raw_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -89,6 +132,9 @@ def main():
         print(f"[!] Connection refused — is the TLS server running on {host}:{port}?")
         sys.exit(1)
 
+    # No Nagle delay on our small messages (see tcp_server.py for why)
+    tls_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
     # Connection established! Print TLS session details.
     print(f"[+] TLS connection established!")
     print(f"    Protocol: {tls_socket.version()}")
@@ -36,63 +36,172 @@ OBSERVE IT LIVE:
 
   # Or with tcpdump (you'll see the handshake packets, but data is encrypted):
   sudo tcpdump -i lo -nn port 9443 -X
+
+  # Let asyncio (on uvloop if installed) run the TLS layer instead:
+  NETLAB_IO_BACKEND=asyncio python tls_server.py
 """
 
+import logging
+import selectors
 import socket
 import ssl
-import threading
 import os
 
+from tcp_server import (IO_BACKEND, READS_PER_WAKEUP, WORKERS, check_io_backend,
+                        dump_payload, run_workers, serve_asyncio, setup_logging,
+                        wait_ready)
+
 CERT_DIR = os.path.join(os.path.dirname(__file__), "certs")
 
+# Levels and NETLAB_DUMP_HEX work as in tcp_server.py
+log = logging.getLogger(__name__)
+
+# TLS here is done on plain non-blocking sockets with ssl.SSLObject over two
+# MemoryBIOs, rather than with ssl.SSLSocket:
+#
+#   socket ──ciphertext──→ incoming BIO ──SSLObject.read()──→ plaintext
+#   plaintext ──SSLObject.write()──→ outgoing BIO ──ciphertext──→ socket
+#
+# OpenSSL never touches the socket. We move the ciphertext ourselves, through
+# one shared buffer, and drain both BIOs on every event, so an idle
+# connection holds no buffered bytes on our side. (OpenSSL's own per-
+# connection record buffers are released between records too: CPython turns
+# on SSL_MODE_RELEASE_BUFFERS for every context.) This is also how asyncio
+# runs TLS under the hood.
+
+# Shared buffers, reused by every connection. The event loop is single-
+# threaded and each is emptied before the next connection is serviced, so
+# nobody else can be holding them. A TLS record carries at most 16 KiB of
+# plaintext, which is the most a single SSL read can ever return.
+WIRE_BUF = bytearray(65536)  # ciphertext straight from the socket
+RECV_BUF = bytearray(16384)  # decrypted plaintext
 
-def handle_client(tls_socket: ssl.SSLSocket, address: tuple):
-    """Handle a TLS-wrapped client connection."""
-    # At this point, BOTH the TCP handshake AND TLS handshake are complete.
-    # The tls_socket transparently encrypts/decrypts everything.
-    print(f"[+] TLS connection from {address[0]}:{address[1]}")
-    print(f"    Protocol: {tls_socket.version()}")
-    print(f"    Cipher:   {tls_socket.cipher()[0]} ({tls_socket.cipher()[2]}-bit)")
+# Stop reading from a client whose encrypted replies pile up past this —
+# the same backpressure as tcp_server's out-queue limit.
+WIRE_OUT_MAX = 1 << 20
+
+
+def service(sel: selectors.BaseSelector, client_socket: socket.socket, state: dict, mask: int):
+    """Handle one readiness event for a client connection with TLS established."""
+    # Only called once BOTH the TCP handshake AND TLS handshake are complete.
+    address = state["addr"]
+    tls = state["tls"]
 
     try:
-        while True:
-            # recv() here reads DECRYPTED data. Under the hood:
+        if mask & selectors.EVENT_READ and not state["eof"]:
+            receive(client_socket, state)
+
+            # read() here returns DECRYPTED data. Under the hood:
             #   1. Kernel receives encrypted TLS records from the network
-            #   2. ssl module decrypts them using the session key
-            #   3. Returns plaintext to your application
+            #   2. We copy them into the incoming BIO
+            #   3. OpenSSL decrypts them using the session key
             #
-            # An attacker sniffing the network sees only encrypted garbage.
-            data = tls_socket.recv(4096)
+            # Loop until OpenSSL wants more ciphertext: one socket read may
+            # have delivered several records. (With an SSLSocket this is the
+            # pending() trap — decrypted data the kernel will never wake us
+            # for. With BIOs, everything we got is right here.)
+            while True:
+                try:
+                    n = tls.read(len(RECV_BUF), RECV_BUF)
+                except ssl.SSLWantReadError:
+                    # Only part of a TLS record has arrived — OpenSSL can't
+                    # decrypt until the rest shows up. Wait for more.
+                    break
+                except (ssl.SSLZeroReturnError, ssl.SSLEOFError):
+                    # close_notify, or the socket closed without one
+                    n = 0
 
-            if not data:
-                print(f"[-] {address[0]}:{address[1]} disconnected")
-                break
+                if not n:
+                    # The client is done sending — but it may only have
+                    # half-closed and still be reading. Stop reading, and
+                    # close below once every reply has left.
+                    state["eof"] = True
+                    break
 
-            print(f"[<] Received (decrypted): {data.decode('utf-8', errors='replace')}")
+                data = memoryview(RECV_BUF)[:n]
+                log.debug("[<] Received %d bytes (decrypted)", n)
+                dump_payload(data)
 
-            # sendall() encrypts the data before sending:
-            #   1. ssl module encrypts plaintext → TLS record
-            #   2. TLS record includes a MAC (message authentication code)
-            #      so the receiver can verify the data wasn't tampered with
-            #   3. Encrypted record sent over TCP
-            tls_socket.sendall(data)
-            print(f"[>] Echoed (encrypted on the wire)")
+                # write() encrypts:
+                #   1. plaintext → TLS record
+                #   2. the record includes a MAC (message authentication code)
+                #      so the receiver can verify it wasn't tampered with
+                #   3. the record lands in the outgoing BIO
+                # It never blocks — the BIO just grows. Every record from this
+                # wakeup then leaves in one send(), sharing TCP segments.
+                tls.write(data)
+                log.debug("[>] Echoed %d bytes (encrypted on the wire)", n)
+
+        transmit(client_socket, state)
+
+        if state["eof"] and not (state["outgoing"].pending or state["wire_out"]):
+            log.info("[-] %s:%d disconnected", address[0], address[1])
+            close_client(sel, client_socket)
+            return
+
+        wait_for(sel, client_socket, state)
 
     except ssl.SSLError as e:
-        print(f"[!] SSL error: {e}")
-    except ConnectionResetError:
-        print(f"[!] Connection reset by {address[0]}:{address[1]}")
-    finally:
-        tls_socket.close()
+        log.warning("[!] SSL error: %s", e)
+        close_client(sel, client_socket)
+    except (ConnectionResetError, BrokenPipeError):
+        log.info("[!] Connection reset by %s:%d", address[0], address[1])
+        close_client(sel, client_socket)
 
 
-def main():
-    # Step 1: Create a regular TCP socket (same as before)
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+def receive(client_socket: socket.socket, state: dict):
+    """Move ciphertext from the socket into the incoming BIO."""
+    for _ in range(READS_PER_WAKEUP):
+        try:
+            n = client_socket.recv_into(WIRE_BUF)
+        except BlockingIOError:
+            return
+        if not n:
+            # The next SSLObject.read()/do_handshake() reports the EOF
+            state["incoming"].write_eof()
+            return
+        state["incoming"].write(memoryview(WIRE_BUF)[:n])
 
-    # Step 2: Create an SSL context — this holds our TLS configuration
-    #
+
+def transmit(client_socket: socket.socket, state: dict):
+    """
+    Move ciphertext from the outgoing BIO to the socket.
+
+    Same non-blocking rule as raw TCP: send what fits, keep the rest in
+    wire_out. When nothing is queued, send straight from the bytes the BIO
+    returned and copy only what the kernel didn't take.
+    """
+    wire_out = state["wire_out"]
+    data = state["outgoing"].read()
+    if wire_out:
+        wire_out += data
+        data = wire_out
+    if not data:
+        return
+    try:
+        sent = client_socket.send(data)
+    except BlockingIOError:
+        sent = 0
+    if data is wire_out:
+        del wire_out[:sent]
+    else:
+        wire_out += memoryview(data)[sent:]
+
+
+def close_client(sel: selectors.BaseSelector, client_socket: socket.socket):
+    sel.unregister(client_socket)
+    client_socket.close()
+
+
+def _build_context() -> ssl.SSLContext:
+    """
+    Build the server's SSL context — once per process.
+
+    The context holds everything that doesn't change per connection: the
+    parsed certificate chain and private key, allowed versions and ciphers,
+    the session ticket keys. Every wrap_bio() reuses it, so none of that
+    is redone per handshake. (It's safe to share across threads too.)
+    """
     # PROTOCOL_TLS_SERVER = server-side TLS with automatic version negotiation.
     # The context holds:
     #   - Which TLS versions to allow (1.2, 1.3)
@@ -115,53 +224,199 @@ def main():
     # Optional: set minimum TLS version (disable old, insecure versions)
     context.minimum_version = ssl.TLSVersion.TLSv1_2
 
+    # TLS 1.2 cipher suites: only forward-secret ECDHE key exchange with AEAD
+    # ciphers (AES-GCM has hardware support almost everywhere; ChaCha20 is
+    # fast in software for clients without it). With SERVER_PREFERENCE our
+    # order wins over the client's.
+    #
+    # TLS 1.3 suites can't be changed from Python — OpenSSL's defaults are
+    # already exactly these AEADs.
+    context.set_ciphers("ECDHE+AESGCM:ECDHE+CHACHA20")
+    context.options |= ssl.OP_NO_COMPRESSION | ssl.OP_CIPHER_SERVER_PREFERENCE
+
+    # Session resumption: after a full handshake the server hands out a
+    # session ticket; a returning client presents it and skips the key
+    # exchange and certificate verification. OP_NO_TICKET would disable that.
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = 2  # TLS 1.3: tickets issued per full handshake
+
+    # A client that half-closes (shutdown(SHUT_WR)) without sending a
+    # close_notify first is still waiting for the rest of its echo. OpenSSL 3
+    # treats that bare TCP FIN as a truncation attack and queues a fatal
+    # decode_error alert behind our replies; this option reports it as a
+    # normal end of stream instead. An echo server acts on nothing the
+    # client could truncate, so there's nothing to protect here.
+    context.options |= getattr(ssl, "OP_IGNORE_UNEXPECTED_EOF", 0)
+
+    # Key-exchange groups are left at OpenSSL's default list (X25519 first).
+    # Pinning one curve with set_ecdh_curve() would force clients whose key
+    # share guessed a different group into a HelloRetryRequest — an extra
+    # round trip on every handshake.
+
+    # SSLKEYLOGFILE=/tmp/keys.log makes OpenSSL write the session secrets,
+    # which lets Wireshark decrypt a capture. Never enable this in production.
+    keylog = os.environ.get("SSLKEYLOGFILE")
+    if keylog:
+        context.keylog_filename = keylog
+
+    return context
+
+
+_CONTEXT = _build_context()
+
+
+def accept_new(sel: selectors.BaseSelector, server: socket.socket, context: ssl.SSLContext):
+    """Accept a TCP connection and start its TLS handshake in the event loop."""
+    # accept() returns a raw TCP socket (3-way handshake done)
+    try:
+        client_socket, address = server.accept()
+    except BlockingIOError:
+        return  # spurious wakeup: the accept queue is already empty
+    except ConnectionAbortedError:
+        return  # client gave up while it sat in the queue
+    except OSError as e:
+        # EMFILE/ENFILE: out of file descriptors. Leave the rest queued.
+        log.warning("[!] accept failed: %s", e)
+        return
+
+    # No Nagle delay on small replies (see tcp_server.py). This matters even
+    # more for TLS: the handshake itself is several small request/reply flights.
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    client_socket.setblocking(False)
+
+    # wrap_bio() attaches server-side TLS state to a pair of memory buffers
+    # instead of a socket. Nothing happens on the wire yet: handshake() below
+    # drives it step by step, so one slow (or malicious) client mid-handshake
+    # never blocks the other connections sharing this thread.
+    incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    tls = context.wrap_bio(incoming, outgoing, server_side=True)
+
+    state = {"addr": address, "tls": tls, "incoming": incoming, "outgoing": outgoing,
+             "wire_out": bytearray(), "eof": False, "service": handshake}
+    sel.register(client_socket, selectors.EVENT_READ, data=state)
+
+
+def handshake(sel: selectors.BaseSelector, client_socket: socket.socket, state: dict, mask: int):
+    """
+    Advance the TLS handshake as far as the bytes on hand allow.
+
+    The handshake is where the magic happens:
+      1. Server sends its certificate
+      2. Client verifies the cert (if it trusts our CA)
+      3. They negotiate a cipher suite and exchange keys
+    Each step needs the peer's next flight of bytes. do_handshake() consumes
+    what's in the incoming BIO, writes our reply flight to the outgoing BIO,
+    and raises SSLWantReadError when it needs the client's next flight.
+    """
+    address = state["addr"]
+    tls = state["tls"]
+    try:
+        if mask & selectors.EVENT_READ:
+            receive(client_socket, state)
+        try:
+            tls.do_handshake()
+        except ssl.SSLWantReadError:
+            transmit(client_socket, state)
+            wait_for(sel, client_socket, state)
+            return
+        # Our last flight (and TLS 1.3 session tickets) are still in the BIO
+        transmit(client_socket, state)
+    except (ssl.SSLError, OSError) as e:
+        # Client doesn't trust our CA, wrong hostname, expired cert, etc.
+        log.warning("[!] TLS handshake failed from %s: %s", address, e)
+        close_client(sel, client_socket)
+        return
+
+    cipher, _, bits = tls.cipher()
+    log.info("[+] TLS connection from %s:%d", address[0], address[1])
+    log.info("    Protocol: %s", tls.version())
+    log.info("    Cipher:   %s (%d-bit)", cipher, bits)
+
+    # Handshake done → switch this connection to the echo handler. The client
+    # may have sent app data right behind its Finished message, and it may
+    # already be sitting in the incoming BIO, so run one read pass now rather
+    # than waiting for a readiness event that might never come.
+    state["service"] = service
+    service(sel, client_socket, state, selectors.EVENT_READ)
+
+
+def wait_for(sel: selectors.BaseSelector, client_socket: socket.socket, state: dict):
+    """EVENT_WRITE while ciphertext is queued; EVENT_READ unless too much is."""
+    events = 0
+    if len(state["wire_out"]) < WIRE_OUT_MAX and not state["eof"]:
+        events |= selectors.EVENT_READ
+    if state["wire_out"]:
+        events |= selectors.EVENT_WRITE
+    if sel.get_key(client_socket).events != events:
+        sel.modify(client_socket, events, data=state)
+
+
+def main():
+    # _CONTEXT is built at import, before run_workers() forks: every worker
+    # shares the parsed certificate AND the session ticket keys, so a ticket
+    # issued by one worker resumes on any other.
+    check_io_backend()
+    if IO_BACKEND in ("uring", "threads"):
+        # Both drive plain sockets; TLS here lives in SSLObject + MemoryBIO
+        # state that only the selectors and asyncio loops know how to pump.
+        print(f"[!] No {IO_BACKEND} backend for TLS, falling back to selectors")
+    setup_logging()
+    run_workers(serve_forever, WORKERS)
+
+
+def serve_forever():
+    # Step 1: Create a regular TCP socket (same as before)
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if WORKERS > 1:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    # Step 2: The SSL context was already built at import (_CONTEXT above)
+    context = _CONTEXT
     print(f"[*] Loaded certificate: {os.path.join(CERT_DIR, 'server.crt')}")
     print(f"[*] Loaded private key: {os.path.join(CERT_DIR, 'server.key')}")
 
     host = "0.0.0.0"
     port = 9443  # 443 is the standard HTTPS port; we use 9443 to avoid needing root
     server.bind((host, port))
-    server.listen(5)
-    print(f"[*] TLS Echo Server listening on {host}:{port}")
+    server.listen(socket.SOMAXCONN)  # a deep accept queue, see tcp_server.py
+    print(f"[*] TLS Echo Server listening on {host}:{port} (pid {os.getpid()})")
     print(f"[*] Try: python tls_client.py")
     print(f"[*] Or:  openssl s_client -connect localhost:{port} -CAfile certs/ca.crt")
     print(f"[*] Or:  curl --cacert certs/ca.crt https://localhost:{port}/")
 
     try:
-        while True:
-            # accept() returns a raw TCP socket (3-way handshake done)
-            client_socket, address = server.accept()
-
-            # wrap_socket() performs the TLS handshake on top of the TCP connection.
-            # This is where the magic happens:
-            #   1. Server sends its certificate
-            #   2. Client verifies the cert (if it trusts our CA)
-            #   3. They negotiate a cipher suite and exchange keys
-            #   4. Returns an SSLSocket that encrypts/decrypts transparently
-            #
-            # If the handshake fails (client doesn't trust our CA, wrong hostname,
-            # expired cert, etc.), this raises ssl.SSLError.
-            try:
-                tls_socket = context.wrap_socket(
-                    client_socket,
-                    server_side=True,
-                )
-            except ssl.SSLError as e:
-                print(f"[!] TLS handshake failed from {address}: {e}")
-                client_socket.close()
-                continue
-
-            thread = threading.Thread(
-                target=handle_client,
-                args=(tls_socket, address),
-                daemon=True,
-            )
-            thread.start()
+        if IO_BACKEND == "asyncio":
+            serve_asyncio(server, context)
+        else:
+            serve_selectors(server, context)
     except KeyboardInterrupt:
         print("\n[*] Shutting down")
+        # How many handshakes were resumed from a session ticket instead of
+        # doing the full key exchange + certificate verification
+        stats = context.session_stats()
+        print(f"[*] Sessions: {stats['accept_good']} handshakes, {stats['hits']} resumed")
     finally:
         server.close()
 
 
+def serve_selectors(server: socket.socket, context: ssl.SSLContext):
+    # One thread, one selector, every connection (see tcp_server.py for the
+    # full explanation of the event loop).
+    sel = selectors.DefaultSelector()
+    server.setblocking(False)
+    sel.register(server, selectors.EVENT_READ, data=None)
+
+    try:
+        while True:
+            for key, mask in wait_ready(sel):
+                if key.data is None:
+                    accept_new(sel, key.fileobj, context)
+                else:
+                    key.data["service"](sel, key.fileobj, key.data, mask)
+    finally:
+        sel.close()
+
+
 if __name__ == "__main__":
     main()
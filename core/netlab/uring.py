@@ -0,0 +1,293 @@
+"""
+io_uring from Python (ctypes, no dependencies)
+===============================================
+
+WHAT THIS TEACHES:
+- How io_uring replaces "wait for readiness, then do the syscall" (epoll)
+  with "queue the syscall, collect the result later" (completion-based IO)
+- The two shared-memory rings: Submission Queue (SQ) and Completion Queue (CQ)
+- Why batching matters: ONE io_uring_enter() can submit many operations
+  and reap many completions
+
+EPOLL vs IO_URING for one echo round-trip:
+  epoll:     epoll_wait() → recv() → send()          3 syscalls per message
+  io_uring:  [RECV queued] → io_uring_enter() → [SEND queued] → ...
+             Operations sit in shared memory; the kernel picks them up on the
+             next io_uring_enter(), which also returns finished results.
+             With N busy clients, one enter() services all N.
+
+THE RINGS (mmap'd memory shared between us and the kernel):
+  SQ ring:  we write Submission Queue Entries (SQEs) and bump the tail,
+            the kernel consumes from the head.
+  CQ ring:  the kernel writes Completion Queue Entries (CQEs) and bumps the
+            tail, we consume from the head.
+  Each CQE carries the `user_data` we put in the SQE, so we know which
+  operation finished, and `res` — what the syscall would have returned
+  (bytes transferred, a new fd, or -errno).
+
+This is deliberately the bare kernel ABI (what liburing wraps in C), driven
+from ctypes so the lab stays stdlib-only. Python's ctypes loads/stores have
+no memory barriers; that's fine on x86-64 (stores are not reordered with
+other stores), but not on weakly ordered CPUs like arm64, where the kernel
+could see a new SQ tail before the SQE behind it. Ring() refuses to start
+anywhere but x86-64.
+
+Requires Linux 5.1+ (5.19+ for multishot accept, 6.0+ for SEND_ZC). Many
+container runtimes block io_uring via seccomp — Ring() then raises OSError
+and callers should fall back to epoll.
+"""
+
+import ctypes
+import mmap
+import os
+import platform
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.syscall.restype = ctypes.c_long
+
+# Syscall numbers — io_uring was added after the syscall tables were unified,
+# so these are the same on x86-64 and arm64.
+SYS_IO_URING_SETUP = 425
+SYS_IO_URING_ENTER = 426
+
+# mmap offsets that select which ring we're mapping
+IORING_OFF_SQ_RING = 0
+IORING_OFF_CQ_RING = 0x8000000
+IORING_OFF_SQES = 0x10000000
+
+# io_uring_setup() flags
+IORING_SETUP_COOP_TASKRUN = 1 << 8   # don't IPI us to run completion work
+IORING_SETUP_SINGLE_ISSUER = 1 << 12  # only one thread submits (true for us)
+IORING_SETUP_DEFER_TASKRUN = 1 << 13  # run completion work only inside enter()
+
+IORING_FEAT_SINGLE_MMAP = 1 << 0
+IORING_ENTER_GETEVENTS = 1 << 0
+
+# Opcodes we use (see include/uapi/linux/io_uring.h)
+IORING_OP_ACCEPT = 13
+IORING_OP_SEND = 26
+IORING_OP_RECV = 27
+IORING_OP_SEND_ZC = 47
+
+IORING_ACCEPT_MULTISHOT = 1 << 0
+
+# CQE flags
+IORING_CQE_F_MORE = 1 << 1   # more CQEs will follow for this SQE
+IORING_CQE_F_NOTIF = 1 << 3  # this CQE is a zero-copy "buffer released" notice
+
+
+class _SQRingOffsets(ctypes.Structure):
+    _fields_ = [
+        ("head", ctypes.c_uint32), ("tail", ctypes.c_uint32),
+        ("ring_mask", ctypes.c_uint32), ("ring_entries", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32), ("dropped", ctypes.c_uint32),
+        ("array", ctypes.c_uint32), ("resv1", ctypes.c_uint32),
+        ("user_addr", ctypes.c_uint64),
+    ]
+
+
+class _CQRingOffsets(ctypes.Structure):
+    _fields_ = [
+        ("head", ctypes.c_uint32), ("tail", ctypes.c_uint32),
+        ("ring_mask", ctypes.c_uint32), ("ring_entries", ctypes.c_uint32),
+        ("overflow", ctypes.c_uint32), ("cqes", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32), ("resv1", ctypes.c_uint32),
+        ("user_addr", ctypes.c_uint64),
+    ]
+
+
+class _Params(ctypes.Structure):
+    _fields_ = [
+        ("sq_entries", ctypes.c_uint32), ("cq_entries", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32), ("sq_thread_cpu", ctypes.c_uint32),
+        ("sq_thread_idle", ctypes.c_uint32), ("features", ctypes.c_uint32),
+        ("wq_fd", ctypes.c_uint32), ("resv", ctypes.c_uint32 * 3),
+        ("sq_off", _SQRingOffsets), ("cq_off", _CQRingOffsets),
+    ]
+
+
+class SQE(ctypes.Structure):
+    """One Submission Queue Entry — 64 bytes describing a syscall to run."""
+    _fields_ = [
+        ("opcode", ctypes.c_uint8),
+        ("flags", ctypes.c_uint8),
+        ("ioprio", ctypes.c_uint16),     # also: per-op flags like ACCEPT_MULTISHOT
+        ("fd", ctypes.c_int32),
+        ("off", ctypes.c_uint64),        # also: addr2 (e.g. accept's addrlen*)
+        ("addr", ctypes.c_uint64),       # buffer / sockaddr pointer
+        ("len", ctypes.c_uint32),
+        ("op_flags", ctypes.c_uint32),   # msg_flags / accept_flags / ...
+        ("user_data", ctypes.c_uint64),  # echoed back in the CQE
+        ("buf_index", ctypes.c_uint16),
+        ("personality", ctypes.c_uint16),
+        ("file_index", ctypes.c_int32),
+        ("addr3", ctypes.c_uint64),
+        ("_pad2", ctypes.c_uint64),
+    ]
+
+
+class CQE(ctypes.Structure):
+    """One Completion Queue Entry — the result of a finished SQE."""
+    _fields_ = [
+        ("user_data", ctypes.c_uint64),
+        ("res", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+    ]
+
+
+def buffer_address(buf: bytearray) -> tuple:
+    """
+    Return (address, keepalive) for a bytearray the kernel will read or write.
+
+    The kernel holds on to the raw pointer until the CQE arrives, so the
+    bytearray must not be resized or freed meanwhile. Holding `keepalive`
+    (a ctypes view exporting the buffer) makes Python refuse to resize it.
+    """
+    view = (ctypes.c_char * len(buf)).from_buffer(buf)
+    return ctypes.addressof(view), view
+
+
+class Ring:
+    """A minimal io_uring instance: queue SQEs, submit, iterate CQEs."""
+
+    def __init__(self, entries: int = 256, flags: int = 0):
+        # No barriers around the ring's head/tail (see top of file): on arm64
+        # this would corrupt data silently, so fail loudly and let the caller
+        # fall back to epoll.
+        machine = platform.machine()
+        if machine != "x86_64":
+            raise OSError(f"io_uring via ctypes needs x86-64 memory ordering, "
+                          f"not {machine}")
+        params = _Params(flags=flags)
+        fd = _libc.syscall(SYS_IO_URING_SETUP, entries, ctypes.byref(params))
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"io_uring_setup: {os.strerror(err)}")
+        self.fd = fd
+        self.flags = flags
+
+        sq, cq = params.sq_off, params.cq_off
+        sq_size = sq.array + params.sq_entries * 4
+        cq_size = cq.cqes + params.cq_entries * ctypes.sizeof(CQE)
+        if params.features & IORING_FEAT_SINGLE_MMAP:
+            sq_size = cq_size = max(sq_size, cq_size)
+
+        prot = mmap.PROT_READ | mmap.PROT_WRITE
+        self._sq_map = mmap.mmap(fd, sq_size, mmap.MAP_SHARED | mmap.MAP_POPULATE, prot,
+                                 offset=IORING_OFF_SQ_RING)
+        if params.features & IORING_FEAT_SINGLE_MMAP:
+            self._cq_map = self._sq_map
+        else:
+            self._cq_map = mmap.mmap(fd, cq_size, mmap.MAP_SHARED | mmap.MAP_POPULATE, prot,
+                                     offset=IORING_OFF_CQ_RING)
+        self._sqe_map = mmap.mmap(fd, params.sq_entries * ctypes.sizeof(SQE),
+                                  mmap.MAP_SHARED | mmap.MAP_POPULATE, prot,
+                                  offset=IORING_OFF_SQES)
+
+        u32 = ctypes.c_uint32
+        self._sq_head = u32.from_buffer(self._sq_map, sq.head)
+        self._sq_tail = u32.from_buffer(self._sq_map, sq.tail)
+        self._sq_mask = u32.from_buffer(self._sq_map, sq.ring_mask).value
+        self._sq_entries = params.sq_entries
+        self._sqes = (SQE * params.sq_entries).from_buffer(self._sqe_map)
+
+        # The SQ ring holds *indices* into the SQE array rather than SQEs
+        # themselves. We always use slot i for index i, so fill it once.
+        sq_array = (u32 * params.sq_entries).from_buffer(self._sq_map, sq.array)
+        for i in range(params.sq_entries):
+            sq_array[i] = i
+        del sq_array
+
+        self._cq_head = u32.from_buffer(self._cq_map, cq.head)
+        self._cq_tail = u32.from_buffer(self._cq_map, cq.tail)
+        self._cq_mask = u32.from_buffer(self._cq_map, cq.ring_mask).value
+        self._cqes = (CQE * params.cq_entries).from_buffer(self._cq_map, cq.cqes)
+
+        # SQEs we've filled in but not yet handed to the kernel
+        self._tail = self._sq_tail.value
+        self._to_submit = 0
+
+    def get_sqe(self) -> SQE:
+        """Claim the next free SQE (zeroed). Submits first if the SQ is full."""
+        if self._tail - self._sq_head.value >= self._sq_entries:
+            self.submit()
+        sqe = self._sqes[self._tail & self._sq_mask]
+        ctypes.memset(ctypes.addressof(sqe), 0, ctypes.sizeof(SQE))
+        self._tail = (self._tail + 1) & 0xFFFFFFFF
+        self._to_submit += 1
+        return sqe
+
+    def submit(self, wait_nr: int = 0) -> int:
+        """
+        Publish queued SQEs and optionally wait for `wait_nr` completions.
+
+        This is the ONLY syscall in the hot path: everything queued since the
+        last call goes to the kernel in one io_uring_enter().
+        """
+        self._sq_tail.value = self._tail
+        flags = IORING_ENTER_GETEVENTS if wait_nr or self.flags & IORING_SETUP_DEFER_TASKRUN else 0
+        while True:
+            ret = _libc.syscall(SYS_IO_URING_ENTER, self.fd, self._to_submit, wait_nr, flags, None, 0)
+            if ret >= 0:
+                break
+            err = ctypes.get_errno()
+            if err != 4:  # EINTR — a signal arrived; let Python run its handler and retry
+                raise OSError(err, f"io_uring_enter: {os.strerror(err)}")
+        self._to_submit -= ret
+        return ret
+
+    def completions(self):
+        """Yield (user_data, res, flags) for every CQE currently in the ring."""
+        head = self._cq_head.value
+        while head != self._cq_tail.value:
+            cqe = self._cqes[head & self._cq_mask]
+            user_data, res, flags = cqe.user_data, cqe.res, cqe.flags
+            head = (head + 1) & 0xFFFFFFFF
+            # Hand the slot back before yielding so the caller can queue more
+            self._cq_head.value = head
+            yield user_data, res, flags
+
+    # -- prep helpers (the same shape as liburing's io_uring_prep_*) ----------
+
+    def prep_accept(self, fd: int, user_data: int, multishot: bool = False):
+        sqe = self.get_sqe()
+        sqe.opcode = IORING_OP_ACCEPT
+        sqe.fd = fd
+        sqe.op_flags = os.O_CLOEXEC
+        if multishot:
+            # One SQE, a CQE for EVERY accepted connection until cancelled
+            sqe.ioprio = IORING_ACCEPT_MULTISHOT
+        sqe.user_data = user_data
+
+    def prep_recv(self, fd: int, addr: int, length: int, user_data: int):
+        sqe = self.get_sqe()
+        sqe.opcode = IORING_OP_RECV
+        sqe.fd = fd
+        sqe.addr = addr
+        sqe.len = length
+        sqe.user_data = user_data
+
+    def prep_send(self, fd: int, addr: int, length: int, user_data: int):
+        sqe = self.get_sqe()
+        sqe.opcode = IORING_OP_SEND
+        sqe.fd = fd
+        sqe.addr = addr
+        sqe.len = length
+        sqe.user_data = user_data
+
+    def prep_send_zc(self, fd: int, addr: int, length: int, user_data: int):
+        """
+        Zero-copy send: produces TWO CQEs with the same user_data — first the
+        result (flags has IORING_CQE_F_MORE), later a notification (flags has
+        IORING_CQE_F_NOTIF) once the kernel no longer references the buffer.
+        """
+        self.prep_send(fd, addr, length, user_data)
+        self._sqes[(self._tail - 1) & self._sq_mask].opcode = IORING_OP_SEND_ZC
+
+    def close(self):
+        # Drop our ctypes views first — mmap refuses to close while exported
+        del self._sq_head, self._sq_tail, self._sqes
+        del self._cq_head, self._cq_tail, self._cqes
+        for m in {id(m): m for m in (self._sq_map, self._cq_map, self._sqe_map)}.values():
+            m.close()
+        os.close(self.fd)
@@ -1,4 +1,25 @@
-from phoenix.otel import register
+import functools
+import os
 
-tracer_provider = register(project_name="default", auto_instrument=True, batch=False)
 
+@functools.lru_cache(maxsize=1)
+def get_tracer_provider():
+    # OTEL_SDK_DISABLED=true: no exporter, no background thread (benchmark runs)
+    if os.environ.get("OTEL_SDK_DISABLED", "").lower() == "true":
+        from opentelemetry.trace import NoOpTracerProvider
+        return NoOpTracerProvider()
+
+    # batch=True exports spans from a background thread instead of inline on
+    # every span end. Flush every 5 s or every 512 spans unless overridden.
+    os.environ.setdefault("OTEL_BSP_SCHEDULE_DELAY", "5000")
+    os.environ.setdefault("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "512")
+
+    from phoenix.otel import register
+    return register(project_name="default", auto_instrument=True, batch=True)
+
+
+def __getattr__(name):
+    # `from core.traces import tracer_provider` still works, registering on first use
+    if name == "tracer_provider":
+        return get_tracer_provider()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")